@@ -1,167 +1,617 @@
 #!/usr/bin/env python3
 """
 Contador de Moedas Brasileiras usando YOLOv8
-Detecta moedas com HoughCircles e classifica com YOLOv8
+Detecta moedas com HoughCircles e classifica com YOLOv8 (ONNX Runtime),
+ou detecta e classifica em um único passo com um detector YOLOv8 (.pt)
 """
 
+import ast
 import cv2
+from functools import lru_cache
 import numpy as np
 import argparse
+import queue
+import threading
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Tamanho de entrada fixo do classificador (YOLOv8n-cls)
+TAMANHO_ENTRADA = 224
+
+# Ordem de preferência dos execution providers do onnxruntime
+PROVIDERS_ONNX = [
+    'TensorrtExecutionProvider',
+    'CUDAExecutionProvider',
+    'OpenVINOExecutionProvider',
+    'CPUExecutionProvider'
+]
+
+class ModeloONNX:
+    """Classificador YOLOv8 exportado para ONNX, executado via onnxruntime"""
+    
+    def __init__(self, modelo_path):
+        import onnxruntime as ort
+        disponiveis = ort.get_available_providers()
+        providers = [p for p in PROVIDERS_ONNX if p in disponiveis]
+        self.sessao = ort.InferenceSession(str(modelo_path), providers=providers)
+        
+        entrada = self.sessao.get_inputs()[0]
+        self.entrada = entrada.name
+        # Modelos exportados sem dynamic=True aceitam apenas lote de tamanho fixo
+        self.lote_fixo = entrada.shape[0] if isinstance(entrada.shape[0], int) else None
+        
+        # O export do Ultralytics grava o mapeamento índice -> classe nos metadados
+        metadados = self.sessao.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadados['names'])
+    
+    def __call__(self, lote):
+        """Recebe um lote (N, 3, H, W) float32 e retorna as probabilidades (N, classes)"""
+        if self.lote_fixo is None:
+            return self.sessao.run(None, {self.entrada: lote})[0]
+        
+        saidas = [
+            self.sessao.run(None, {self.entrada: lote[i:i + self.lote_fixo]})[0]
+            for i in range(0, len(lote), self.lote_fixo)
+        ]
+        return np.concatenate(saidas)
+
+def carregar_modelo_ultralytics(modelo_path):
+    """Carrega um modelo YOLOv8 via Ultralytics, configurando o PyTorch para inferência"""
+    import torch
+    from ultralytics import YOLO
+    
+    # cuDNN escolhe o algoritmo mais rápido para a entrada fixa; TF32 nas matmuls em FP32
+    torch.backends.cudnn.benchmark = True
+    torch.set_float32_matmul_precision('high')
+    
+    model = YOLO(modelo_path)
+    
+    if not modelo_deteccao(model):
+        # Classificador é chamado diretamente (sem predictor): funde Conv+BN,
+        # fixa o dispositivo e usa FP16 na GPU
+        model.model.fuse(verbose=False)
+        model.model.eval()
+        if torch.cuda.is_available():
+            model.model.to(torch.device('cuda:0')).half()
+    
+    return model
+
+@lru_cache(maxsize=4)
 def carregar_modelo(modelo_path):
-    """Carrega o modelo YOLOv8"""
+    """
+    Carrega o modelo YOLOv8 (.onnx via onnxruntime, demais via Ultralytics).
+    O modelo fica em cache, então várias imagens reutilizam a mesma instância.
+    """
     try:
-        from ultralytics import YOLO
-        model = YOLO(modelo_path)
+        if Path(modelo_path).suffix.lower() == '.onnx':
+            model = ModeloONNX(modelo_path)
+        else:
+            model = carregar_modelo_ultralytics(modelo_path)
+        
+        # Aquecimento: a primeira inferência real não paga a inicialização do runtime
+        vazia = np.zeros((TAMANHO_ENTRADA, TAMANHO_ENTRADA, 3), dtype=np.uint8)
+        if modelo_deteccao(model):
+            model(vazia, verbose=False)
+        else:
+            classificar_moedas(model, [vazia])
+        
         print(f"[INFO] Modelo carregado: {modelo_path}")
         return model
     except Exception as e:
         print(f"[ERRO] Falha ao carregar modelo: {e}")
         return None
 
-def detectar_circulos(imagem, min_raio=20, max_raio=200):
-    """Detecta círculos usando HoughCircles"""
+def modelo_deteccao(model):
+    """Indica se o modelo é um detector YOLOv8 (detecta e classifica em um só passo)"""
+    return getattr(model, 'task', None) == 'detect'
+
+@lru_cache(maxsize=1)
+def cuda_disponivel():
+    """Verifica se o OpenCV foi compilado com CUDA e há uma GPU disponível"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+@lru_cache(maxsize=8)
+def hough_cuda(min_raio, max_raio, min_dist):
+    """Cria uma única vez o buffer, o filtro e o detector de círculos na GPU"""
+    gpu_img = cv2.cuda_GpuMat()
+    filtro = cv2.cuda.createMedianFilter(cv2.CV_8UC1, 5)
+    # cannyThreshold e votesThreshold equivalem a param1 e param2 da CPU
+    detector = cv2.cuda.createHoughCirclesDetector(1, min_dist, 200, 30, min_raio, max_raio)
+    return gpu_img, filtro, detector
+
+def hough_circulos_cuda(imagem, min_raio, max_raio, min_dist):
+    """HoughCircles na GPU (módulo cv2.cuda); retorna os círculos em float ou None"""
+    gpu_img, filtro, detector = hough_cuda(min_raio, max_raio, min_dist)
+    gpu_img.upload(imagem)
+    
+    gpu_gray = cv2.cuda.cvtColor(gpu_img, cv2.COLOR_BGR2GRAY)
+    gpu_blurred = filtro.apply(gpu_gray)
+    
+    circles = detector.detect(gpu_blurred).download()
+    return circles[0] if circles is not None else None
+
+def hough_circulos(imagem, min_raio, max_raio, min_dist):
+    """HoughCircles na CPU; retorna os círculos em float ou None"""
     gray = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (9, 9), 2)
+    # Mediana 5x5 basta para ruído; o limiar do Canny (param1) compensa o filtro mais leve
+    blurred = cv2.medianBlur(gray, 5)
     
     circles = cv2.HoughCircles(
         blurred, 
         cv2.HOUGH_GRADIENT, 
         dp=1,
-        minDist=50,
-        param1=100,
+        minDist=min_dist,
+        param1=200,
         param2=30,
         minRadius=min_raio,
         maxRadius=max_raio
     )
+    return circles[0] if circles is not None else None
+
+def detectar_circulos(imagem, min_raio=20, max_raio=200, lado_max=1024):
+    """
+    Detecta círculos usando HoughCircles (na GPU quando disponível).
+    Imagens maiores que lado_max são reduzidas antes do Hough e os círculos
+    são convertidos de volta para a resolução original.
+    """
+    h, w = imagem.shape[:2]
+    escala = min(1.0, lado_max / max(h, w))
+    min_dist = 50
+    
+    if escala < 1.0:
+        imagem = cv2.resize(imagem, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        min_raio = max(1, round(min_raio * escala))
+        max_raio = max(min_raio + 1, round(max_raio * escala))
+        min_dist = max(1, round(min_dist * escala))
     
-    if circles is not None:
-        return circles[0]
-    return []
+    hough = hough_circulos_cuda if cuda_disponivel() else hough_circulos
+    circles = hough(imagem, min_raio, max_raio, min_dist)
+    
+    if circles is None:
+        return np.empty((0, 3), dtype=np.int32)
+    
+    if escala < 1.0:
+        circles = circles / escala
+    
+    # Converte todos os círculos de uma vez, em vez de int() por moeda
+    return circles.astype(np.int32)
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def preencher_fundo(recorte, cx, cy, r, cinza):
+        """Pinta de cinza, em uma única passada, os pixels fora do círculo (cx, cy, r)"""
+        for y in prange(recorte.shape[0]):
+            for x in range(recorte.shape[1]):
+                if (x - cx) ** 2 + (y - cy) ** 2 > r * r:
+                    recorte[y, x, 0] = cinza
+                    recorte[y, x, 1] = cinza
+                    recorte[y, x, 2] = cinza
+    
+    # Compila na importação, fora do caminho crítico
+    preencher_fundo(np.zeros((2, 2, 3), dtype=np.uint8), 0, 0, 1, 180)
+else:
+    preencher_fundo = None
+
+# Bits de ponto fixo do resize do Pillow (Resample.c), usado no pré-processamento do treino
+PRECISAO_PIL = 22
+
+@lru_cache(maxsize=4)
+def pesos_bilinear(entrada, saida):
+    """
+    Pesos do resize bilinear do PIL de `entrada` para `saida` pixels em um eixo,
+    com os mesmos arredondamentos em ponto fixo. Retorna (inicio, fim, pesos):
+    o intervalo de pixels de entrada de cada saída e a matriz (saida, entrada).
+    """
+    escala = entrada / saida
+    escala_filtro = max(escala, 1.0)
+    inv = 1.0 / escala_filtro
+    
+    inicio = np.zeros(saida, dtype=np.intp)
+    fim = np.zeros(saida, dtype=np.intp)
+    # Pesos inteiros de 22 bits são exatos em float32
+    pesos = np.zeros((saida, entrada), dtype=np.float32)
+    for j in range(saida):
+        # Suporte do filtro triangular: 1 pixel na escala do filtro
+        centro = (j + 0.5) * escala
+        xmin = max(int(centro - escala_filtro + 0.5), 0)
+        xmax = min(int(centro + escala_filtro + 0.5), entrada)
+        w = [max(1.0 - abs((x - centro + 0.5) * inv), 0.0) for x in range(xmin, xmax)]
+        soma = 0.0
+        for v in w:
+            soma += v
+        inicio[j], fim[j] = xmin, xmax
+        pesos[j, xmin:xmax] = [int(0.5 + v / soma * (1 << PRECISAO_PIL)) for v in w]
+    
+    inicio.flags.writeable = fim.flags.writeable = pesos.flags.writeable = False
+    return inicio, fim, pesos
+
+def reamostrar_eixo(regiao, origem, j0, j1, entrada, saida, eixo):
+    """
+    Aplica em um eixo de `regiao` (que começa no pixel `origem` do quadro) o
+    resize bilinear do PIL de `entrada` para `saida`, só para as saídas j0..j1.
+    """
+    n = regiao.shape[eixo]
+    pesos = pesos_bilinear(entrada, saida)[2][j0:j1, origem:origem + n]
+    
+    # Em float64 os produtos de inteiros de 8 e 22 bits e suas somas são exatos
+    amostras = np.moveaxis(regiao, eixo, 0)
+    soma = pesos.astype(np.float64) @ amostras.reshape(n, -1) + (1 << (PRECISAO_PIL - 1))
+    janela = np.clip(soma // (1 << PRECISAO_PIL), 0, 255).astype(np.uint8)
+    return np.moveaxis(janela.reshape((j1 - j0,) + amostras.shape[1:]), 0, eixo)
 
-def preparar_imagem_moeda(imagem, centro, raio):
+@lru_cache(maxsize=256)
+def mascara_circular(r):
+    """Máscara circular (2r+1 x 2r+1) centrada, rasterizada uma única vez por raio"""
+    mask = np.zeros((2 * r + 1, 2 * r + 1), dtype=np.uint8)
+    cv2.circle(mask, (r, r), r, 255, -1)
+    mask.flags.writeable = False
+    return mask
+
+def preparar_imagem_moeda(imagem, centro, raio, tamanho=TAMANHO_ENTRADA):
     """
     Prepara a imagem de uma moeda para classificação.
-    Aplica fundo cinza ao redor para simular imagens de treino.
+    Aplica fundo cinza ao redor para simular imagens de treino: o resultado
+    equivale a pintar o quadro inteiro de cinza fora da moeda e aplicar o
+    pré-processamento do treino (Resize bilinear do PIL com o lado menor em
+    `tamanho`, depois CenterCrop), mas só a região da moeda é lida e reamostrada.
     """
     h, w = imagem.shape[:2]
-    cx, cy = int(centro[0]), int(centro[1])
-    r = int(raio)
+    cx, cy = centro
+    r_mascara = int(raio * 1.1)
+    
+    # Recorta apenas a região ao redor da moeda
+    x0, y0 = max(cx - r_mascara, 0), max(cy - r_mascara, 0)
+    x1, y1 = min(cx + r_mascara + 1, w), min(cy + r_mascara + 1, h)
+    recorte = imagem[y0:y1, x0:x1].copy()
+    
+    if preencher_fundo is not None:
+        # Kernel Numba: máscara e escrita em uma única passada
+        # int() mantém a assinatura compilada no aquecimento (centros podem vir como np.int32)
+        preencher_fundo(recorte, int(cx - x0), int(cy - y0), r_mascara, 180)
+    else:
+        # Reaproveita a máscara do raio, recortada nas bordas da imagem
+        mx, my = x0 - (cx - r_mascara), y0 - (cy - r_mascara)
+        mask = mascara_circular(r_mascara)[my:my + (y1 - y0), mx:mx + (x1 - x0)]
+        
+        # Aplica fundo cinza fora da moeda (escrita in-place, sem composição)
+        recorte[mask == 0] = 180
     
-    # Cria imagem com fundo cinza
-    resultado = np.full_like(imagem, (180, 180, 180))
+    # Geometria do pré-processamento do treino sobre o quadro inteiro:
+    # lado menor vira `tamanho`, o maior é truncado, e o centro é recortado
+    nw, nh = (tamanho, int(tamanho * h / w)) if w <= h else (int(tamanho * w / h), tamanho)
+    ox, oy = round((nw - tamanho) / 2), round((nh - tamanho) / 2)
+    inicio_x, fim_x, _ = pesos_bilinear(w, nw)
+    inicio_y, fim_y, _ = pesos_bilinear(h, nh)
     
-    # Cria máscara circular
-    mask = np.zeros((h, w), dtype=np.uint8)
-    cv2.circle(mask, (cx, cy), int(r * 1.1), 255, -1)
+    # Pixels da saída cujo filtro alcança o recorte; os demais são cinza puro
+    jx0 = max(int(np.searchsorted(fim_x, x0, side='right')), ox)
+    jx1 = min(int(np.searchsorted(inicio_x, x1)), ox + tamanho)
+    jy0 = max(int(np.searchsorted(fim_y, y0, side='right')), oy)
+    jy1 = min(int(np.searchsorted(inicio_y, y1)), oy + tamanho)
     
-    # Copia moeda para fundo cinza
-    resultado = np.where(mask[:, :, None] == 255, imagem, resultado)
+    resultado = np.full((tamanho, tamanho, 3), 180, dtype=np.uint8)
+    if jx1 <= jx0 or jy1 <= jy0:
+        return resultado
+    
+    # Região do quadro lida por esses pixels; fora do recorte ela é só fundo cinza
+    ax0, ax1 = min(int(inicio_x[jx0]), x0), max(int(fim_x[jx1 - 1]), x1)
+    ay0, ay1 = min(int(inicio_y[jy0]), y0), max(int(fim_y[jy1 - 1]), y1)
+    regiao = np.full((ay1 - ay0, ax1 - ax0, 3), 180, dtype=np.uint8)
+    regiao[y0 - ay0:y1 - ay0, x0 - ax0:x1 - ax0] = recorte
+    
+    # Mesma ordem do PIL: passada horizontal, depois vertical
+    regiao = reamostrar_eixo(regiao, ax0, jx0, jx1, w, nw, eixo=1)
+    resultado[jy0 - oy:jy1 - oy, jx0 - ox:jx1 - ox] = reamostrar_eixo(regiao, ay0, jy0, jy1, h, nh, eixo=0)
     
     return resultado
 
-def classificar_moeda(model, imagem):
-    """Classifica uma moeda usando YOLOv8"""
+def empilhar_lote(imagens):
+    """Empilha imagens BGR 224x224 em um lote (N, 3, H, W) RGB uint8 contíguo"""
+    return np.ascontiguousarray(np.stack(imagens)[:, :, :, ::-1].transpose(0, 3, 1, 2))
+
+def preprocessar_lote(imagens):
+    """Converte imagens BGR 224x224 em um lote (N, 3, H, W) RGB float32 em [0, 1]"""
+    return empilhar_lote(imagens).astype(np.float32) / 255.0
+
+def classificar_moedas(model, imagens):
+    """
+    Classifica várias moedas com um único forward do YOLOv8.
+    Retorna uma lista de (classe, confiança) na mesma ordem das imagens.
+    """
+    if isinstance(model, ModeloONNX):
+        probs = model(preprocessar_lote(imagens))
+        idxs = probs.argmax(axis=1)
+        confiancas = probs[np.arange(len(probs)), idxs]
+        names = model.names
+        return [(names[i], c) for i, c in zip(idxs.tolist(), confiancas.tolist())]
+    
+    # Ultralytics: chama a rede diretamente com o lote já montado, sem o
+    # pré/pós-processamento do predictor (recortes já têm 224x224)
+    import torch
+    parametro = next(model.model.parameters())
+    lote = torch.from_numpy(empilhar_lote(imagens)).to(parametro.device, non_blocking=True)
+    lote = lote.to(parametro.dtype).div_(255)
+    
+    with torch.inference_mode():
+        probs = model.model(lote)
+    if isinstance(probs, (tuple, list)):
+        probs = probs[0]
+    
+    confiancas, idxs = probs.max(dim=1)
+    names = model.names
+    return [(names[i], c) for i, c in zip(idxs.tolist(), confiancas.float().tolist())]
+
+def detectar_moedas_yolo(model, imagem):
+    """
+    Detecta e classifica todas as moedas com um único forward de um detector YOLOv8.
+    Retorna uma lista de ((cx, cy, raio), (classe, confiança)).
+    """
     results = model(imagem, verbose=False)
+    names = results[0].names
+    
+    # Uma única cópia GPU -> CPU para todas as caixas
+    boxes = results[0].boxes.cpu().numpy()
+    xywh = boxes.xywh.astype(np.int32)
+    idxs = boxes.cls.astype(np.int32)
+    confiancas = boxes.conf
     
-    if results and len(results) > 0:
-        probs = results[0].probs
-        classe_idx = probs.top1
-        confianca = probs.top1conf.item()
-        nome_classe = results[0].names[classe_idx]
-        return nome_classe, confianca
+    deteccoes = []
+    for (cx, cy, w, h), i, conf in zip(xywh.tolist(), idxs.tolist(), confiancas.tolist()):
+        deteccoes.append(((cx, cy, max(w, h) // 2), (names[i], conf)))
     
-    return None, 0.0
+    return deteccoes
+
+# Tabelas de denominações indexadas por posição; a última entrada é a classe desconhecida
+CLASSES_MOEDAS = {'5': 0, '10': 1, '25': 2, '50': 3, '100': 4}
+VALORES_MOEDAS = np.array([0.05, 0.10, 0.25, 0.50, 1.00, 0.0])
+NOMES_MOEDAS = np.array(['5 centavos', '10 centavos', '25 centavos', '50 centavos', '1 real',
+                         'Desconhecida'])
+
+# Diâmetros físicos (mm) das moedas da 2ª família do Real, na ordem de CLASSES_MOEDAS
+DIAMETROS_MOEDAS = np.array([22.0, 20.0, 25.0, 23.0, 27.0])
+
+# 5 e 50 centavos diferem só 1 mm (~2px nas fotos do repo): sempre vão para o modelo
+MOEDAS_SO_MODELO = ('5', '50')
+
+def indices_moedas(classes):
+    """Converte nomes de classe em índices das tabelas de denominações"""
+    desconhecida = len(CLASSES_MOEDAS)
+    return np.array([CLASSES_MOEDAS.get(c, desconhecida) for c in classes], dtype=np.intp)
 
 def valor_moeda(classe):
     """Retorna o valor em reais de uma classe"""
-    valores = {
-        '5': 0.05,
-        '10': 0.10,
-        '25': 0.25,
-        '50': 0.50,
-        '100': 1.00
-    }
-    return valores.get(classe, 0.0)
+    return float(VALORES_MOEDAS[indices_moedas([classe])[0]])
 
 def nome_moeda(classe):
     """Retorna o nome legível da moeda"""
-    nomes = {
-        '5': '5 centavos',
-        '10': '10 centavos',
-        '25': '25 centavos',
-        '50': '50 centavos',
-        '100': '1 real'
-    }
-    return nomes.get(classe, 'Desconhecida')
+    return str(NOMES_MOEDAS[indices_moedas([classe])[0]])
 
-def processar_imagem(imagem_path, modelo_path, salvar_resultado=True):
-    """Processa uma imagem e conta as moedas"""
+def classificar_por_raio(raios, salto_min=0.03, tolerancia_escala=0.03, margem=3.0,
+                         espalhamento_min=1.0):
+    """
+    Classifica moedas apenas pelo raio, usando as proporções dos diâmetros físicos.
+    Só é aplicada quando os raios formam exatamente um grupo por denominação, em
+    proporção com os diâmetros; caso contrário retorna None para todas as moedas.
+    Uma moeda só é atribuída ao grupo mais próximo se a folga em pixels até o
+    segundo grupo passar de `margem` vezes o espalhamento (MAD, com piso de
+    `espalhamento_min` px) dos dois grupos; as demais, e as de MOEDAS_SO_MODELO,
+    ficam como None.
+    Retorna uma lista com (classe, folga em pixels) ou None para cada raio.
+    A folga não é uma confiança do classificador.
+    """
+    raios = np.asarray(raios, dtype=np.float64)
+    n = len(raios)
+    resultado = [None] * n
+    if n < len(CLASSES_MOEDAS):
+        return resultado
+    
+    # Separa grupos onde o salto entre raios consecutivos passa de 1px e de salto_min
+    r = np.sort(raios)
+    cortes = np.flatnonzero(np.diff(r) > np.maximum(1.0, salto_min * r[:-1])) + 1
+    grupos = np.split(r, cortes)
+    if len(grupos) != len(CLASSES_MOEDAS):
+        return resultado
+    
+    # Em ordem de raio, os grupos devem seguir as proporções dos diâmetros físicos
+    modas = np.array([np.median(g) for g in grupos])
+    ordem_diametros = np.argsort(DIAMETROS_MOEDAS)
+    escalas = modas / DIAMETROS_MOEDAS[ordem_diametros]
+    if escalas.std() / escalas.mean() > tolerancia_escala:
+        return resultado
+    
+    # Espalhamento de cada grupo (MAD na escala do desvio padrão); o piso cobre
+    # grupos de poucas moedas e o truncamento dos raios para inteiros
+    espalhamento = np.array([max(1.4826 * np.median(np.abs(g - m)), espalhamento_min)
+                             for g, m in zip(grupos, modas)])
+    
+    # Atribui cada moeda ao grupo mais próximo se a folga até o segundo superar
+    # o espalhamento dos dois grupos
+    dist = np.abs(raios[:, None] - modas[None, :])
+    proximos = np.argsort(dist, axis=1)
+    g1, g2 = proximos[:, 0], proximos[:, 1]
+    folga = dist[np.arange(n), g2] - dist[np.arange(n), g1]
+    aceitas = folga > margem * np.maximum(espalhamento[g1], espalhamento[g2])
     
-    # Carrega imagem
+    classes = list(CLASSES_MOEDAS)
+    for i in np.flatnonzero(aceitas).tolist():
+        classe = classes[ordem_diametros[g1[i]]]
+        if classe not in MOEDAS_SO_MODELO:
+            resultado[i] = (classe, float(folga[i]))
+    
+    return resultado
+
+def preparar_entrada(imagem_path, model, por_raio=False):
+    """
+    Etapa de CPU do pipeline: carrega a imagem, detecta os círculos e prepara
+    os recortes das moedas. Retorna (imagem, circulos, recortes, pre_classificacoes),
+    ou None se a imagem não puder ser carregada.
+    
+    Com por_raio=True, as moedas identificadas sem ambiguidade pelo raio já vêm
+    em pre_classificacoes e só as demais recebem recorte para o modelo.
+    """
     imagem = cv2.imread(str(imagem_path))
     if imagem is None:
-        print(f"[ERRO] Não foi possível carregar: {imagem_path}")
         return None
     
-    print(f"[INFO] Imagem carregada: {imagem_path}")
-    print(f"[INFO] Dimensões: {imagem.shape[1]}x{imagem.shape[0]}")
+    # Detector YOLOv8 recebe a imagem inteira
+    if modelo_deteccao(model):
+        return imagem, None, None, None
+    
+    circulos = detectar_circulos(imagem)
+    
+    if por_raio:
+        pre_classificacoes = classificar_por_raio(circulos[:, 2])
+    else:
+        pre_classificacoes = [None] * len(circulos)
+    
+    # Prepara imagens com fundo cinza
+    recortes = [preparar_imagem_moeda(imagem, (cx, cy), raio)
+                for (cx, cy, raio), pre in zip(circulos, pre_classificacoes) if pre is None]
+    
+    return imagem, circulos, recortes, pre_classificacoes
+
+def processar_imagem(imagem_path, modelo_path, salvar_resultado=True, output_path="resultado.jpg",
+                     por_raio=False):
+    """Processa uma imagem e conta as moedas"""
     
     # Carrega modelo
     model = carregar_modelo(modelo_path)
     if model is None:
         return None
     
-    # Detecta círculos
-    print("\n[1/2] Detectando moedas (HoughCircles)...")
-    circulos = detectar_circulos(imagem)
-    print(f"      {len(circulos)} círculos detectados")
+    entrada = preparar_entrada(imagem_path, model, por_raio)
+    return contar_moedas(imagem_path, entrada, model, salvar_resultado, output_path)
+
+def processar_imagens(imagens, modelo_path, salvar_resultado=True, por_raio=False):
+    """
+    Processa várias imagens em pipeline: uma thread carrega, detecta e recorta
+    a próxima imagem enquanto a thread principal classifica a atual.
+    """
+    model = carregar_modelo(modelo_path)
+    if model is None:
+        return []
     
-    if len(circulos) == 0:
-        print("[AVISO] Nenhuma moeda detectada")
+    fila = queue.Queue(maxsize=2)
+    
+    def produtor():
+        for imagem_path in imagens:
+            try:
+                entrada = preparar_entrada(imagem_path, model, por_raio)
+            except BaseException as e:
+                # O erro segue pela fila e é relançado na thread principal
+                fila.put((imagem_path, e))
+                return
+            fila.put((imagem_path, entrada))
+        fila.put(None)
+    
+    threading.Thread(target=produtor, daemon=True).start()
+    
+    resultados = []
+    while True:
+        item = fila.get()
+        if item is None:
+            break
+        imagem_path, entrada = item
+        if isinstance(entrada, BaseException):
+            raise entrada
+        
+        # Com várias imagens, cada resultado recebe o nome da imagem de origem
+        if len(imagens) > 1:
+            output_path = f"resultado_{Path(imagem_path).stem}.jpg"
+        else:
+            output_path = "resultado.jpg"
+        
+        resultados.append(contar_moedas(imagem_path, entrada, model, salvar_resultado, output_path))
+    
+    return resultados
+
+def contar_moedas(imagem_path, entrada, model, salvar_resultado=True, output_path="resultado.jpg"):
+    """Classifica as moedas de uma entrada preparada, desenha e exibe o resumo"""
+    
+    if entrada is None:
+        print(f"[ERRO] Não foi possível carregar: {imagem_path}")
         return None
+    imagem, circulos, recortes, pre_classificacoes = entrada
+    
+    print(f"[INFO] Imagem carregada: {imagem_path}")
+    print(f"[INFO] Dimensões: {imagem.shape[1]}x{imagem.shape[0]}")
+    
+    pelo_raio = []
+    if modelo_deteccao(model):
+        # Detector YOLOv8: localiza e classifica as moedas em um único passo
+        print("\n[1/1] Detectando e classificando moedas (YOLOv8)...")
+        deteccoes = detectar_moedas_yolo(model, imagem)
+        print(f"      {len(deteccoes)} moedas detectadas")
+    else:
+        # Círculos já detectados na etapa de preparação
+        print("\n[1/2] Detectando moedas (HoughCircles)...")
+        print(f"      {len(circulos)} círculos detectados")
+        
+        if len(circulos) > 0:
+            # Classifica de uma vez as moedas não identificadas pelo raio
+            print("\n[2/2] Classificando moedas (YOLOv8)...")
+            classificacoes = list(pre_classificacoes)
+            pelo_raio = [c is not None for c in classificacoes]
+            pendentes = [i for i, c in enumerate(classificacoes) if c is None]
+            if len(pendentes) < len(classificacoes):
+                print(f"      {len(classificacoes) - len(pendentes)} moedas identificadas pelo raio")
+            if pendentes:
+                for i, c in zip(pendentes, classificar_moedas(model, recortes)):
+                    classificacoes[i] = c
+            deteccoes = list(zip(circulos.tolist(), classificacoes))
+        else:
+            deteccoes = []
     
-    # Classifica cada moeda
-    print("\n[2/2] Classificando moedas (YOLOv8)...")
+    if len(deteccoes) == 0:
+        print("[AVISO] Nenhuma moeda detectada")
+        return None
     
     resultado_img = imagem.copy()
     moedas = []
-    valor_total = 0.0
     
-    for circulo in circulos:
-        cx, cy, raio = circulo
-        
-        # Prepara imagem com fundo cinza
-        img_preparada = preparar_imagem_moeda(imagem, (cx, cy), raio)
+    # Valores e nomes de todas as moedas de uma vez
+    idxs = indices_moedas([classe for _, (classe, _) in deteccoes])
+    valores = VALORES_MOEDAS[idxs]
+    valor_total = float(valores.sum())
+    
+    pelo_raio += [False] * (len(deteccoes) - len(pelo_raio))
+    
+    for ((cx, cy, raio), (classe, confianca)), valor, nome, por_raio in zip(
+            deteccoes, valores.tolist(), NOMES_MOEDAS[idxs].tolist(), pelo_raio):
+        # Moedas identificadas pelo raio não têm confiança do classificador
+        moedas.append({
+            'classe': classe,
+            'nome': nome,
+            'valor': valor,
+            'confianca': None if por_raio else confianca,
+            'pelo_raio': por_raio,
+            'centro': (cx, cy),
+            'raio': raio
+        })
         
-        # Classifica
-        classe, confianca = classificar_moeda(model, img_preparada)
+        if por_raio:
+            print(f"      Moeda em ({cx}, {cy}): {nome} (pelo raio)")
+        else:
+            print(f"      Moeda em ({cx}, {cy}): {nome} (confiança: {confianca*100:.1f}%)")
         
-        if classe:
-            valor = valor_moeda(classe)
-            nome = nome_moeda(classe)
-            valor_total += valor
-            
-            moedas.append({
-                'classe': classe,
-                'nome': nome,
-                'valor': valor,
-                'confianca': confianca,
-                'centro': (int(cx), int(cy)),
-                'raio': int(raio)
-            })
-            
-            print(f"      Moeda em ({int(cx)}, {int(cy)}): {nome} (confiança: {confianca*100:.1f}%)")
-            
-            # Desenha na imagem
+        # Desenha na imagem (azul: identificada pelo raio)
+        if por_raio:
+            cor = (255, 0, 0)
+        else:
             cor = (0, 255, 0) if confianca > 0.8 else (0, 255, 255) if confianca > 0.5 else (0, 0, 255)
-            cv2.circle(resultado_img, (int(cx), int(cy)), int(raio), cor, 2)
-            cv2.circle(resultado_img, (int(cx), int(cy)), 3, (0, 0, 255), -1)
-            
-            label = f"{nome} ({confianca*100:.0f}%)"
-            cv2.putText(resultado_img, label, (int(cx) - 50, int(cy) - int(raio) - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, cor, 2)
+        cv2.circle(resultado_img, (cx, cy), raio, cor, 2)
+        cv2.circle(resultado_img, (cx, cy), 3, (0, 0, 255), -1)
+        
+        label = f"{nome} (raio)" if por_raio else f"{nome} ({confianca*100:.0f}%)"
+        cv2.putText(resultado_img, label, (cx - 50, cy - raio - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, cor, 2)
     
     # Exibe resumo
     print("\n" + "=" * 40)
@@ -185,7 +635,6 @@ def processar_imagem(imagem_path, modelo_path, salvar_resultado=True):
     
     # Salva resultado
     if salvar_resultado:
-        output_path = "resultado.jpg"
         cv2.imwrite(output_path, resultado_img)
         print(f"\n[INFO] Imagem resultado salva em: {output_path}")
     
@@ -197,14 +646,23 @@ def processar_imagem(imagem_path, modelo_path, salvar_resultado=True):
 
 def main():
     parser = argparse.ArgumentParser(description='Contador de Moedas Brasileiras')
-    parser.add_argument('imagem', help='Caminho da imagem')
-    parser.add_argument('--modelo', '-m', default='runs/moedas_cls/weights/best.pt',
-                       help='Caminho do modelo YOLOv8 (default: runs/moedas_cls/weights/best.pt)')
+    parser.add_argument('imagens', nargs='+', help='Caminho da(s) imagem(ns)')
+    parser.add_argument('--modelo', '-m', default='models/moedas_classifier.onnx',
+                       help='Caminho do modelo YOLOv8, .onnx ou .pt (default: models/moedas_classifier.onnx)')
+    parser.add_argument('--int8', action='store_true',
+                       help='Usa a versão quantizada INT8 do modelo ONNX (<modelo>_int8.onnx)')
+    parser.add_argument('--por-raio', action='store_true',
+                       help='Identifica pelo raio as moedas sem ambiguidade e usa o modelo só para as demais')
     parser.add_argument('--no-save', action='store_true', help='Não salvar imagem resultado')
     
     args = parser.parse_args()
     
-    processar_imagem(args.imagem, args.modelo, salvar_resultado=not args.no_save)
+    modelo = Path(args.modelo)
+    if args.int8:
+        modelo = modelo.with_name(f"{modelo.stem}_int8.onnx")
+    
+    processar_imagens(args.imagens, modelo, salvar_resultado=not args.no_save,
+                      por_raio=args.por_raio)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from coin_counter import (CLASSES_MOEDAS, DIAMETROS_MOEDAS, MOEDAS_SO_MODELO,
+                          classificar_por_raio)
+
+CLASSES = list(CLASSES_MOEDAS)
+
+
+def raios_sinteticos(rng, px_por_mm, ruido, por_classe=2):
+    """Raios com as proporções reais, ruído gaussiano e o truncamento de detectar_circulos"""
+    rotulos = np.repeat(np.arange(len(CLASSES)), por_classe)
+    rng.shuffle(rotulos)
+    raios = DIAMETROS_MOEDAS[rotulos] * px_por_mm + rng.normal(0, ruido, len(rotulos))
+    return rotulos, raios.astype(np.int32)
+
+
+class TestClassificarPorRaio(unittest.TestCase):
+
+    def test_raios_com_ruido(self):
+        # ~2 px/mm (raios de 40 a 54 px) e 1 px de ruído, como nas fotos do repo
+        rng = np.random.default_rng(0)
+        atribuidas = erradas = 0
+        for _ in range(1000):
+            rotulos, raios = raios_sinteticos(rng, 2.0, 1.0)
+            for rotulo, resultado in zip(rotulos, classificar_por_raio(raios)):
+                if resultado is not None:
+                    atribuidas += 1
+                    erradas += resultado[0] != CLASSES[rotulo]
+        self.assertGreater(atribuidas, 0)
+        self.assertLess(erradas / atribuidas, 0.02)
+
+    def test_5_e_50_centavos_vao_para_o_modelo(self):
+        rng = np.random.default_rng(1)
+        for _ in range(200):
+            rotulos, raios = raios_sinteticos(rng, 4.0, 0.5)
+            for rotulo, resultado in zip(rotulos, classificar_por_raio(raios)):
+                if CLASSES[rotulo] in MOEDAS_SO_MODELO:
+                    self.assertIsNone(resultado)
+                elif resultado is not None:
+                    self.assertEqual(resultado[0], CLASSES[rotulo])
+
+    def test_raios_sem_ruido(self):
+        raios = (DIAMETROS_MOEDAS * 4).astype(np.int32)
+        resultado = classificar_por_raio(raios)
+        for classe, r in zip(CLASSES, resultado):
+            if classe in MOEDAS_SO_MODELO:
+                self.assertIsNone(r)
+            else:
+                self.assertEqual(r[0], classe)
+
+    def test_grupos_fora_de_proporcao(self):
+        # Cinco grupos bem separados, mas sem as proporções dos diâmetros
+        raios = np.array([30, 30, 40, 40, 50, 50, 60, 60, 70, 70])
+        self.assertEqual(classificar_por_raio(raios), [None] * len(raios))
+
+    def test_poucas_moedas(self):
+        self.assertEqual(classificar_por_raio([40, 44, 50]), [None] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,10 +5,15 @@ Treina um modelo YOLOv8 para classificação de moedas brasileiras.
 Este script:
 - Organiza imagens em pastas por classe (train/val)
 - Treina modelo YOLOv8n-cls
-- Exporta para ONNX (compatível com OpenCV DNN)
+- Exporta para ONNX (compatível com OpenCV DNN) e uma versão quantizada INT8
+
+Com --task detect, treina um detector YOLOv8n que localiza e classifica
+as moedas em um único passo. As caixas são geradas automaticamente com
+HoughCircles sobre as imagens de treino.
 
 Uso:
   python3 train_yolo.py --dataset <pasta_imagens> --epochs 30
+  python3 train_yolo.py --dataset <pasta_imagens> --task detect
 
 Estrutura esperada das imagens:
   <valor>_<id>.jpg  (ex: 50_1477283178.jpg = moeda de 50 centavos)
@@ -16,8 +21,10 @@ Estrutura esperada das imagens:
 """
 
 import argparse
+import os
 import random
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sys
 
@@ -35,8 +42,32 @@ def extract_label_from_name(name: str):
     return name
 
 
-def prepare_dataset(src_dir: Path, out_dir: Path, val_fraction=0.2, seed=42):
-    """Organiza o dataset em pastas train/val por classe."""
+def place_file(src: Path, dst: Path, copy=False):
+    """Cria dst como hardlink de src (symlink entre sistemas de arquivos) ou cópia."""
+    if os.path.lexists(dst):
+        return
+    if copy:
+        shutil.copy2(src, dst)
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(src.resolve(), dst)
+
+
+def place_files(pairs, copy=False):
+    """Coloca pares (origem, destino) no dataset em paralelo, ignorando destinos existentes."""
+    # Operações limitadas por I/O: várias threads mantêm a fila do disco ocupada
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        list(ex.map(lambda pair: place_file(*pair, copy=copy), pairs))
+
+
+def prepare_dataset(src_dir: Path, out_dir: Path, val_fraction=0.2, seed=42, copy=False):
+    """
+    Organiza o dataset em pastas train/val por classe.
+    Por padrão usa hardlinks (ou symlinks); com copy=True copia os arquivos.
+    """
     images = find_images(src_dir)
     if not images:
         raise SystemExit(f'Nenhuma imagem encontrada em {src_dir!s}')
@@ -58,6 +89,7 @@ def prepare_dataset(src_dir: Path, out_dir: Path, val_fraction=0.2, seed=42):
     out_val.mkdir(parents=True, exist_ok=True)
 
     names = []
+    pairs = []
     for lbl, items in sorted(classes.items(), key=lambda x: int(x[0]) if x[0].isdigit() else 0):
         names.append(lbl)
         # Cria subpastas por classe
@@ -70,18 +102,14 @@ def prepare_dataset(src_dir: Path, out_dir: Path, val_fraction=0.2, seed=42):
         train_items = items[:cut]
         val_items = items[cut:]
         
-        # Copia arquivos
-        for src in train_items:
-            dst = out_train / lbl / src.name
-            if not dst.exists():
-                shutil.copy2(src, dst)
-        for src in val_items:
-            dst = out_val / lbl / src.name
-            if not dst.exists():
-                shutil.copy2(src, dst)
+        # Agenda arquivos para o dataset
+        pairs += [(src, out_train / lbl / src.name) for src in train_items]
+        pairs += [(src, out_val / lbl / src.name) for src in val_items]
         
         print(f"  {lbl}: {len(train_items)} train, {len(val_items)} val")
 
+    place_files(pairs, copy=copy)
+
     print(f"\nDataset organizado em: {out_dir}")
     print(f"  - {out_train}")
     print(f"  - {out_val}")
@@ -90,8 +118,56 @@ def prepare_dataset(src_dir: Path, out_dir: Path, val_fraction=0.2, seed=42):
     return out_dir, names
 
 
-def train(data_dir: Path, epochs: int, imgsz: int, batch: int, lr: float, project: str):
-    """Treina o modelo YOLOv8."""
+def prepare_detection_dataset(cls_dir: Path, out_dir: Path, class_names, copy=False):
+    """
+    Gera um dataset de detecção (formato YOLO) a partir do dataset de classificação.
+    Cada imagem contém uma moeda; a caixa é derivada do círculo encontrado por HoughCircles.
+    """
+    import cv2
+    from coin_counter import detectar_circulos
+
+    pairs = []
+    for split in ('train', 'val'):
+        images_dir = out_dir / 'images' / split
+        labels_dir = out_dir / 'labels' / split
+        images_dir.mkdir(parents=True, exist_ok=True)
+        labels_dir.mkdir(parents=True, exist_ok=True)
+
+        labeled, skipped = 0, 0
+        for idx, lbl in enumerate(class_names):
+            for src in find_images(cls_dir / split / lbl):
+                img = cv2.imread(str(src))
+                circles = detectar_circulos(img) if img is not None else []
+                if len(circles) == 0:
+                    skipped += 1
+                    continue
+
+                # Usa o círculo mais forte como caixa da moeda
+                h, w = img.shape[:2]
+                cx, cy, r = circles[0]
+                bw, bh = min(2 * r, w) / w, min(2 * r, h) / h
+                (labels_dir / f'{src.stem}.txt').write_text(
+                    f'{idx} {cx / w:.6f} {cy / h:.6f} {bw:.6f} {bh:.6f}\n')
+                pairs.append((src, images_dir / src.name))
+                labeled += 1
+
+        print(f"  {split}: {labeled} imagens rotuladas, {skipped} sem moeda detectada")
+
+    place_files(pairs, copy=copy)
+
+    # Sem dependência de PyYAML: o arquivo é simples o suficiente
+    data_yaml = out_dir / 'data.yaml'
+    names = '\n'.join(f'  {i}: \'{lbl}\'' for i, lbl in enumerate(class_names))
+    data_yaml.write_text(
+        f'path: {out_dir.resolve()}\ntrain: images/train\nval: images/val\nnames:\n{names}\n')
+
+    print(f"\nDataset de detecção organizado em: {out_dir}")
+    return data_yaml
+
+
+def train(data_dir: Path, epochs: int, imgsz: int, batch: int, lr: float, project: str,
+          task='classify'):
+    """Treina o modelo YOLOv8 (classificação ou detecção)."""
     try:
         from ultralytics import YOLO
     except ImportError:
@@ -106,35 +182,107 @@ def train(data_dir: Path, epochs: int, imgsz: int, batch: int, lr: float, projec
     print(f'  Image size: {imgsz}')
     
     # Carrega modelo base
-    model = YOLO('yolov8n-cls.pt')
+    if task == 'detect':
+        model = YOLO('yolov8n.pt')
+        name = 'moedas_det'
+    else:
+        model = YOLO('yolov8n-cls.pt')
+        name = 'moedas_cls'
     
-    # Treina - YOLOv8 classificação espera diretório, não YAML
+    # Treina - classificação espera diretório, detecção espera data.yaml
     results = model.train(
-        data=str(data_dir),  # Diretório com train/ e val/
+        data=str(data_dir),
         epochs=epochs,
         imgsz=imgsz,
         batch=batch,
         lr0=lr,
         project=project,
-        name='moedas_cls',
+        name=name,
         exist_ok=True
     )
     
     return model, results
 
 
-def export_model(model, export_dir: Path):
-    """Exporta modelo para ONNX (compatível com OpenCV DNN)."""
+def calibration_images(calib_dir: Path, n_images=64, imgsz=224, seed=42):
+    """
+    Seleciona e pré-processa imagens de treino para calibração INT8, pelo
+    mesmo caminho da inferência (HoughCircles + recorte da moeda).
+    """
+    import cv2
+    from coin_counter import detectar_circulos, preparar_imagem_moeda, preprocessar_lote
+
+    images = [p for lbl_dir in sorted(calib_dir.iterdir()) if lbl_dir.is_dir()
+              for p in find_images(lbl_dir)]
+    random.Random(seed).shuffle(images)
+
+    n = 0
+    for p in images:
+        if n >= n_images:
+            break
+        img = cv2.imread(str(p))
+        if img is None:
+            continue
+        circles = detectar_circulos(img)
+        if len(circles) == 0:
+            continue
+        # Usa o círculo mais forte, como em prepare_detection_dataset
+        cx, cy, r = circles[0].tolist()
+        yield preprocessar_lote([preparar_imagem_moeda(img, (cx, cy), r, tamanho=imgsz)])
+        n += 1
+
+
+def quantize_int8(onnx_path: Path, calib_dir: Path, out_path: Path, n_images=64):
+    """Quantiza o modelo ONNX para INT8 (quantização estática por canal)."""
+    try:
+        import onnxruntime as ort
+        from onnxruntime.quantization import (CalibrationDataReader, QuantType,
+                                              quantize_static)
+    except ImportError:
+        print('Aviso: onnxruntime não instalado, modelo INT8 não gerado.')
+        return None
+
+    input_name = ort.InferenceSession(str(onnx_path)).get_inputs()[0].name
+
+    class CoinCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = calibration_images(calib_dir, n_images)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    quantize_static(
+        str(onnx_path),
+        str(out_path),
+        CoinCalibrationReader(),
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8
+    )
+    return out_path
+
+
+def export_model(model, export_dir: Path, calib_dir: Path = None):
+    """Exporta modelo para ONNX (compatível com OpenCV DNN) e ONNX INT8."""
     print("\nExportando modelo para ONNX...")
     
-    # Exporta para ONNX
-    onnx_path = model.export(format='onnx', imgsz=224, simplify=True)
+    # Exporta para ONNX com lote dinâmico (permite classificar várias moedas por chamada)
+    onnx_path = model.export(format='onnx', imgsz=224, simplify=True, dynamic=True)
     
     # Copia para diretório de saída
     out_onnx = export_dir / 'moedas_classifier.onnx'
     shutil.copy2(onnx_path, out_onnx)
     
     print(f"Modelo ONNX salvo em: {out_onnx}")
+    
+    # Quantiza para INT8 usando imagens de treino como calibração
+    if calib_dir is not None:
+        print("\nQuantizando modelo para INT8...")
+        out_int8 = quantize_int8(out_onnx, calib_dir, export_dir / 'moedas_classifier_int8.onnx')
+        if out_int8:
+            print(f"Modelo INT8 salvo em: {out_int8}")
+    
     return out_onnx
 
 
@@ -142,14 +290,20 @@ def parse_args():
     p = argparse.ArgumentParser(description='Treina YOLOv8 para classificação de moedas')
     p.add_argument('--dataset', type=Path, required=True,
                    help='Pasta com imagens (nomeadas como <valor>_<id>.jpg)')
+    p.add_argument('--task', choices=('classify', 'detect'), default='classify',
+                   help='Classificador (HoughCircles + YOLOv8-cls) ou detector YOLOv8 (default: classify)')
     p.add_argument('--out', type=Path, default=Path('data/cls_dataset'),
                    help='Pasta de saída do dataset organizado')
+    p.add_argument('--det-out', type=Path, default=Path('data/det_dataset'),
+                   help='Pasta de saída do dataset de detecção (--task detect)')
+    p.add_argument('--copy', action='store_true',
+                   help='Copia as imagens em vez de criar hardlinks/symlinks')
     p.add_argument('--val', type=float, default=0.2,
                    help='Fração para validação (default: 0.2)')
     p.add_argument('--epochs', type=int, default=30,
                    help='Número de epochs (default: 30)')
-    p.add_argument('--imgsz', type=int, default=224,
-                   help='Tamanho da imagem (default: 224)')
+    p.add_argument('--imgsz', type=int, default=None,
+                   help='Tamanho da imagem (default: 224 para classify, 640 para detect)')
     p.add_argument('--batch', type=int, default=16,
                    help='Batch size (default: 16)')
     p.add_argument('--lr', type=float, default=0.01,
@@ -175,24 +329,41 @@ def main():
     # Prepara dataset
     print(f'\n[1/3] Preparando dataset de {args.dataset}...')
     data_dir, class_names = prepare_dataset(
-        args.dataset, args.out, val_fraction=args.val
+        args.dataset, args.out, val_fraction=args.val, copy=args.copy
     )
     
+    if args.task == 'detect':
+        print(f'\nGerando caixas de detecção (HoughCircles)...')
+        data_dir = prepare_detection_dataset(data_dir, args.det_out, class_names, copy=args.copy)
+    
+    if args.imgsz is None:
+        args.imgsz = 640 if args.task == 'detect' else 224
+    
     # Treina modelo
     print(f'\n[2/3] Treinando modelo...')
     model, results = train(
-        data_dir,  # Passa diretório, não YAML
+        data_dir,  # Diretório (classify) ou data.yaml (detect)
         epochs=args.epochs,
         imgsz=args.imgsz,
         batch=args.batch,
         lr=args.lr,
-        project=args.project
+        project=args.project,
+        task=args.task
     )
     
+    if args.task == 'detect':
+        # O detector é usado diretamente pelo coin_counter.py via Ultralytics
+        print("\n" + "=" * 60)
+        print("  TREINAMENTO CONCLUÍDO!")
+        print("=" * 60)
+        print(f"\nDetector salvo em: {model.trainer.best}")
+        print(f"Uso: python3 coin_counter.py <imagem> --modelo {model.trainer.best}")
+        return
+    
     # Exporta modelo
     print(f'\n[3/3] Exportando modelo...')
     args.export.mkdir(parents=True, exist_ok=True)
-    onnx_path = export_model(model, args.export)
+    onnx_path = export_model(model, args.export, calib_dir=data_dir / 'train')
     
     # Salva mapeamento de classes
     classes_file = args.export / 'classes.txt'
@@ -204,6 +375,9 @@ def main():
     print("=" * 60)
     print(f"\nArquivos gerados:")
     print(f"  - Modelo ONNX: {onnx_path}")
+    int8_path = args.export / 'moedas_classifier_int8.onnx'
+    if int8_path.exists():
+        print(f"  - Modelo ONNX INT8: {int8_path}")
     print(f"  - Classes: {classes_file}")
     print(f"\nPara usar no C++, copie esses arquivos para a pasta do projeto.")
 